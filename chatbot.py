@@ -9,16 +9,65 @@ Usage:
     python chatbot.py --model llama3.2   # Use different model
 """
 
+import io
 import os
+import re
 import sys
+import wave
+import queue
+import atexit
+import functools
+import shutil
 import subprocess
 import tempfile
+import threading
 import json
 import time
 import requests
 import platform
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 
+try:
+    import numpy as np
+    import onnxruntime
+    from piper import PiperVoice
+    from piper.config import PiperConfig
+    from piper.voice import AudioChunk
+except ImportError:
+    PiperVoice = None
+
+# sounddevice writes PCM straight to the sound card; it raises OSError when PortAudio is missing
+try:
+    import sounddevice
+except (ImportError, OSError):
+    sounddevice = None
+
+try:
+    import winsound
+except ImportError:
+    winsound = None
+
+# orjson parses the per-token NDJSON stream several times faster than the stdlib
+try:
+    import orjson
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    json_loads = json.loads
+
+    def json_dumps(obj):
+        return json.dumps(obj).encode("utf-8")
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Ask for the file as stored, so Content-Length is its real size and not a gzipped one
+IDENTITY_HEADERS = {"Accept-Encoding": "identity"}
+
+
+_HERE = Path(__file__).resolve().parent
+VOICES_DIR = _HERE / "voices"
 
 # Voice model download URLs (from Piper GitHub releases)
 VOICE_URLS = {
@@ -28,47 +77,153 @@ VOICE_URLS = {
     "en_US-lessac-high.onnx.json": "https://huggingface.co/rhasspy/piper-voices/resolve/v1.0.0/en/en_US/lessac/high/en_US-lessac-high.onnx.json",
 }
 
+# Large downloads are split into this many concurrent range requests
+DOWNLOAD_PARTS = 4
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
+# How long a model list from the readiness probe can be reused (seconds)
+TAGS_CACHE_TTL = 5
+
+# Context window sent to Ollama on each turn
+MAX_HISTORY_TURNS = 8
+OLLAMA_NUM_CTX = 4096
+
+# Distinct sentences whose phonemes are remembered per voice
+PHONEME_CACHE_SIZE = 512
+
+# Boundaries used to break long text into speakable chunks, most natural first
+CHUNK_BOUNDARIES = [
+    re.compile(r'(?<=[.!?])\s+'),  # sentences
+    re.compile(r'(?<=[,;])\s+'),   # clauses
+    re.compile(r'\s+'),            # words
+]
+
+# A completed sentence: text up to terminal punctuation (plus closing quotes/brackets)
+# that is followed by whitespace
+SENT_RE = re.compile(r'(.+?[.!?]["\')\]]*)(?=\s)', re.S)
+
+# Setup steps run on several threads; keep each line of output intact
+_print_lock = threading.Lock()
+
+
+def log(*args, **kwargs):
+    """Thread-safe print."""
+    with _print_lock:
+        print(*args, **kwargs)
+
+
+class SetupError(Exception):
+    """A startup step failed; the reason has already been printed."""
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTP adapter that applies a default timeout to requests that don't set one."""
+
+    def __init__(self, *args, timeout=30, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
 
 class OllamaPiperChatbot:
-    def __init__(self, model_name="llama3.2", voice_model=None, ollama_url="http://localhost:11434"):
+    def __init__(self, model_name="llama3.2", voice_model=None, ollama_url="http://localhost:11434", use_cuda=False):
         self.model_name = model_name
-        self.voice_model = voice_model or str(Path(__file__).parent / "voices" / "en_US-lessac-medium.onnx")
+        self.voice_model = voice_model or str(VOICES_DIR / "en_US-lessac-medium.onnx")
+        self._voice_name = Path(self.voice_model).name
         self.ollama_url = ollama_url
+        self.use_cuda = use_cuda
         self.conversation_history = []
-        self.piper_cmd = self._find_piper()
+        self.max_history_turns = MAX_HISTORY_TURNS
+        self._tags_cache = (0.0, None)
+
+        # One keep-alive connection pool for Ollama and voice downloads
+        self.http = requests.Session()
+        adapter = TimeoutHTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=0)
+        self.http.mount("http://", adapter)
+        self.http.mount("https://", adapter)
+
+        # Speech pipeline: chat() queues sentences, _tts_worker synthesizes them into
+        # PCM, _audio_worker plays it. None flows through both queues to mark the end
+        # of an utterance. Sentences are tiny, so _tts_q is unbounded and never stalls
+        # the token stream; the PCM queue is bounded to keep memory flat on long replies.
+        self._tts_q = queue.Queue()
+        self._pcm_q = queue.Queue(maxsize=8)
+        self._speech_done = threading.Event()
+        threading.Thread(target=self._tts_worker, daemon=True).start()
+        threading.Thread(target=self._audio_worker, daemon=True).start()
+
+        log(f"🤖 Initializing Chatbot...")
+        log(f"🦙 Model: {self.model_name}")
+        log(f"🔊 Voice: {self._voice_name}")
+
+        # Ollama, the voice download and Piper are independent, so check them concurrently.
+        # Long-running steps poll _stop_setup so a failure elsewhere can cut them short.
+        self._stop_setup = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=3)
+        futures = [
+            pool.submit(self._check_ollama_and_model),
+            pool.submit(self._ensure_voice_model),
+            pool.submit(self._check_piper),
+        ]
+        try:
+            for future in as_completed(futures):
+                future.result()
+        except (Exception, KeyboardInterrupt) as e:
+            self._stop_setup.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+            if isinstance(e, KeyboardInterrupt):
+                log("\n👋 Setup cancelled")
+            elif not isinstance(e, SetupError):
+                log(f"❌ Error: {e}")
+            sys.exit(1)
+        pool.shutdown()
+
+        # Synthesize in-process and keep one audio player alive for the whole session
+        self.voice = None
+        self.audio_stream = None
+        self.player_proc = None
+        self.wav_playback = False
+        self._load_voice()
+        self._start_player()
+        atexit.register(self._stop_player)
 
-        print(f"🤖 Initializing Chatbot...")
-        print(f"🦙 Model: {self.model_name}")
-        print(f"🔊 Voice: {Path(self.voice_model).name}")
+        log("✅ Ready!\n")
 
+    def _check_ollama_and_model(self):
+        """Make sure Ollama is running and the model is available."""
         self._check_ollama()
         self._ensure_model()
-        self._check_piper()
-        self._ensure_voice_model()
-
-        print("✅ Ready!\n")
 
     def _check_ollama(self):
         """Check if Ollama is running, start it if not."""
         # First, check if already running
-        if self._is_ollama_running():
-            print("✅ Ollama is running")
+        if self._is_ollama_running() is not None:
+            log("✅ Ollama is running")
             return
 
         # Try to start Ollama
-        print("🔄 Ollama not running, attempting to start...")
+        log("🔄 Ollama not running, attempting to start...")
         if not self._start_ollama():
-            print("❌ Failed to start Ollama!")
-            print("   Please install Ollama from: https://ollama.com/download")
-            sys.exit(1)
+            if not self._stop_setup.is_set():
+                log("❌ Failed to start Ollama!")
+                log("   Please install Ollama from: https://ollama.com/download")
+            raise SetupError("failed to start Ollama")
 
     def _is_ollama_running(self):
-        """Check if Ollama server is responding."""
+        """Check if Ollama server is responding, returning its model list (or None)."""
         try:
-            response = requests.get(f"{self.ollama_url}/api/tags", timeout=5)
-            return response.status_code == 200
+            response = self.http.get(f"{self.ollama_url}/api/tags", timeout=5)
+            if response.status_code != 200:
+                return None
+            tags = response.json()
+            self._tags_cache = (time.monotonic(), tags)
+            return tags
         except:
-            return False
+            return None
 
     def _start_ollama(self):
         """Attempt to start Ollama server."""
@@ -109,106 +264,94 @@ class OllamaPiperChatbot:
                     start_new_session=True
                 )
 
-            # Wait for Ollama to start (up to 30 seconds)
-            print("   Waiting for Ollama to start...", end="", flush=True)
-            for i in range(30):
-                time.sleep(1)
-                print(".", end="", flush=True)
-                if self._is_ollama_running():
-                    print(" Started!")
-                    print("✅ Ollama is running")
+            # Wait for Ollama to start (up to 30 seconds), backing off between probes.
+            # Other setup steps print concurrently, so only whole lines are logged.
+            log("   Waiting for Ollama to start...")
+            deadline = time.monotonic() + 30
+            delay = 0.1
+            while time.monotonic() < deadline:
+                if self._stop_setup.wait(delay):
+                    return False
+                delay = min(delay * 1.5, 2.0)
+                if self._is_ollama_running() is not None:
+                    log("✅ Ollama is running")
                     return True
 
-            print(" Timeout!")
+            log("   Timed out waiting for Ollama")
             return False
 
         except Exception as e:
-            print(f"   Error starting Ollama: {e}")
+            log(f"   Error starting Ollama: {e}")
             return False
 
     def _ensure_model(self):
         """Check if model exists, pull if needed."""
         try:
-            response = requests.get(f"{self.ollama_url}/api/tags")
-            models = [m["name"] for m in response.json().get("models", [])]
+            # Reuse the model list from the readiness probe if it's fresh
+            cached_at, tags = self._tags_cache
+            if tags is None or time.monotonic() - cached_at > TAGS_CACHE_TTL:
+                tags = self.http.get(f"{self.ollama_url}/api/tags").json()
+            models = [m["name"] for m in tags.get("models", [])]
 
             # Check for exact match
             if self.model_name in models:
-                print(f"✅ Model '{self.model_name}' ready")
+                log(f"✅ Model '{self.model_name}' ready")
                 return
 
             # Check if model without tag exists as :latest
             model_base = self.model_name.split(":")[0]
             if f"{model_base}:latest" in models and ":" not in self.model_name:
                 self.model_name = f"{model_base}:latest"
-                print(f"✅ Model '{self.model_name}' ready")
+                log(f"✅ Model '{self.model_name}' ready")
                 return
 
-            print(f"📥 Pulling '{self.model_name}'... (this may take a few minutes)")
-            response = requests.post(
+            log(f"📥 Pulling '{self.model_name}'... (this may take a few minutes)")
+            with self.http.post(
                 f"{self.ollama_url}/api/pull",
-                json={"name": self.model_name},
+                data=json_dumps({"name": self.model_name}),
+                headers=JSON_HEADERS,
                 stream=True,
                 timeout=600  # 10 minute timeout for large models
-            )
-
-            last_status = ""
-            for line in response.iter_lines():
-                if line:
-                    data = json.loads(line)
+            ) as response:
+                last_status = ""
+                last_step = -1
+                for data in self._iter_ndjson(response):
+                    if self._stop_setup.is_set():
+                        raise SetupError("model pull cancelled")
                     status = data.get("status", "")
 
                     # Only print status changes (not progress updates)
                     if status and status != last_status and "%" not in status:
-                        print(f"   {status}")
+                        log(f"   {status}")
                         last_status = status
+                        last_step = -1
 
-                    # Show download progress on same line
+                    # Show download progress in 10% steps, one line each
                     if "completed" in data and "total" in data:
                         completed = data["completed"]
                         total = data["total"]
                         if total > 0:
-                            pct = (completed / total) * 100
-                            print(f"\r   Downloading: {pct:.1f}%", end="", flush=True)
-
-            print()  # New line after progress
-            print(f"✅ Model ready")
+                            step = int(completed * 10 // total)
+                            if step != last_step:
+                                log(f"   Downloading: {step * 10}%")
+                                last_step = step
+
+            log(f"✅ Model ready")
+        except SetupError:
+            raise
         except Exception as e:
-            print(f"❌ Error: {e}")
-            sys.exit(1)
-
-    def _find_piper(self):
-        """Find the piper executable."""
-        # Check in venv Scripts folder first (Windows)
-        venv_piper = Path(__file__).parent / "venv" / "Scripts" / "piper.exe"
-        if venv_piper.exists():
-            return str(venv_piper)
-
-        # Check in venv bin folder (Linux/Mac)
-        venv_piper_unix = Path(__file__).parent / "venv" / "bin" / "piper"
-        if venv_piper_unix.exists():
-            return str(venv_piper_unix)
-
-        # Check in same directory as python executable
-        python_dir = Path(sys.executable).parent
-        piper_in_python = python_dir / ("piper.exe" if platform.system() == "Windows" else "piper")
-        if piper_in_python.exists():
-            return str(piper_in_python)
-
-        # Fall back to PATH
-        return "piper"
+            log(f"❌ Error: {e}")
+            raise SetupError(str(e)) from e
 
     def _check_piper(self):
         """Check if Piper is installed."""
-        try:
-            subprocess.run([self.piper_cmd, "--help"], capture_output=True, timeout=5)
-            print("✅ Piper TTS installed")
-        except:
-            print("❌ Piper not found! Install with: pip install piper-tts")
-            sys.exit(1)
+        if PiperVoice is None:
+            log("❌ Piper not found! Install with: pip install piper-tts")
+            raise SetupError("Piper not found")
+        log("✅ Piper TTS installed")
 
     def _ensure_voice_model(self):
-        """Download voice model if not present."""
+        """Download voice model and config if not present."""
         voice_path = Path(self.voice_model)
         json_path = Path(str(self.voice_model) + ".json")
 
@@ -216,186 +359,572 @@ class OllamaPiperChatbot:
         voices_dir = voice_path.parent
         voices_dir.mkdir(parents=True, exist_ok=True)
 
-        # Download voice model if missing
-        if not voice_path.exists():
-            voice_name = voice_path.name
-            if voice_name in VOICE_URLS:
-                print(f"📥 Downloading voice model '{voice_name}'...")
-                try:
-                    response = requests.get(VOICE_URLS[voice_name], stream=True)
-                    response.raise_for_status()
-                    total = int(response.headers.get('content-length', 0))
-                    downloaded = 0
-                    with open(voice_path, 'wb') as f:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            f.write(chunk)
-                            downloaded += len(chunk)
-                            if total > 0:
-                                pct = (downloaded / total) * 100
-                                print(f"\r   Downloading: {pct:.1f}%", end="", flush=True)
-                    print(f"\n✅ Voice model downloaded")
-                except Exception as e:
-                    print(f"\n❌ Failed to download voice: {e}")
-                    sys.exit(1)
-            else:
-                print(f"❌ Voice model not found: {voice_path}")
-                sys.exit(1)
-
-        # Download JSON config if missing
-        if not json_path.exists():
-            json_name = json_path.name
-            if json_name in VOICE_URLS:
-                print(f"📥 Downloading voice config '{json_name}'...")
+        downloads = []
+
+        # Download voice model if missing or incomplete
+        if not voice_path.exists() and voice_path.name not in VOICE_URLS:
+            log(f"❌ Voice model not found: {voice_path}")
+            raise SetupError(f"voice model not found: {voice_path}")
+        if voice_path.name in VOICE_URLS and not self._is_download_current(voice_path):
+            log(f"📥 Downloading voice model '{voice_path.name}'...")
+            downloads.append((voice_path, True))
+
+        # Download JSON config if missing or incomplete
+        if json_path.name in VOICE_URLS and not self._is_download_current(json_path):
+            log(f"📥 Downloading voice config '{json_path.name}'...")
+            downloads.append((json_path, False))
+
+        if not downloads:
+            return
+
+        # Model and config live at independent URLs, so fetch them concurrently
+        with ThreadPoolExecutor(max_workers=len(downloads)) as pool:
+            futures = {
+                pool.submit(self._download, VOICE_URLS[path.name], path, show_progress): path
+                for path, show_progress in downloads
+            }
+            for future in as_completed(futures):
                 try:
-                    response = requests.get(VOICE_URLS[json_name])
-                    response.raise_for_status()
-                    with open(json_path, 'wb') as f:
-                        f.write(response.content)
-                    print(f"✅ Voice config downloaded")
+                    etag = future.result()
+                    if etag:
+                        Path(f"{futures[future]}.etag").write_text(etag)
+                except SetupError:
+                    raise
                 except Exception as e:
-                    print(f"❌ Failed to download config: {e}")
-                    sys.exit(1)
+                    log(f"❌ Failed to download {futures[future].name}: {e}")
+                    raise SetupError(f"failed to download {futures[future].name}") from e
+                log(f"✅ Downloaded {futures[future].name}")
 
-    def text_to_speech(self, text):
-        """Convert text to speech using Piper."""
+    def _is_download_current(self, path):
+        """Check a downloaded file against the server's ETag and size."""
+        if not path.exists():
+            return False
+
+        etag_path = Path(f"{path}.etag")
+        headers = dict(IDENTITY_HEADERS)
+        if etag_path.exists():
+            headers["If-None-Match"] = etag_path.read_text().strip()
         try:
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
-                audio_file = f.name
+            head = self.http.head(VOICE_URLS[path.name], headers=headers, allow_redirects=True, timeout=5)
+        except requests.exceptions.RequestException:
+            # Offline: trust what is on disk
+            return True
+
+        if head.status_code == 304:
+            return True
+        if not head.ok:
+            return True
+
+        size = head.headers.get("content-length")
+        if size is not None and int(size) != path.stat().st_size:
+            log(f"⚠️  {path.name} is incomplete or outdated")
+            return False
 
-            print("🔊 Generating speech...", end="", flush=True)
+        if head.headers.get("etag"):
+            etag_path.write_text(head.headers["etag"])
+        return True
 
-            result = subprocess.run(
-                [self.piper_cmd, "--model", self.voice_model, "--output_file", audio_file],
-                input=text,
-                text=True,
-                capture_output=True,
-                timeout=60
+    def _download(self, url, path, show_progress=False):
+        """Download url to path, in concurrent ranges when supported, and return the server's ETag."""
+        # Resolve redirects once so every range request goes straight to the file host
+        try:
+            head = self.http.head(url, headers=IDENTITY_HEADERS, allow_redirects=True)
+            head.raise_for_status()
+        except requests.exceptions.RequestException:
+            # No usable HEAD: fall back to a single streamed GET
+            head = None
+        etag = None
+        total = 0
+        ranged = False
+        if head is not None:
+            url = head.url
+            etag = head.headers.get("etag")
+            total = int(head.headers.get("content-length", 0))
+            ranged = head.headers.get("accept-ranges") == "bytes"
+
+        if ranged and total >= DOWNLOAD_PARTS * DOWNLOAD_CHUNK_SIZE:
+            step = -(-total // DOWNLOAD_PARTS)
+            ranges = [(start, min(start + step, total) - 1) for start in range(0, total, step)]
+        else:
+            ranges = [None]
+
+        # Write to a side file so an interrupted download never looks complete
+        part_path = Path(str(path) + ".part")
+        with open(part_path, "wb") as f:
+            f.truncate(total)
+
+        lock = threading.Lock()
+        # Set on the first failed range so the others stop instead of finishing their transfer
+        cancel = threading.Event()
+        downloaded = 0
+        last_step = -1
+
+        def fetch(byte_range):
+            nonlocal downloaded, last_step, etag
+            headers = {"Range": f"bytes={byte_range[0]}-{byte_range[1]}"} if byte_range else {}
+            with self.http.get(url, headers=headers, stream=True) as response:
+                response.raise_for_status()
+                if byte_range and response.status_code != 206:
+                    raise RuntimeError("server ignored range request")
+                if head is None:
+                    etag = response.headers.get("etag")
+                with open(part_path, "r+b") as f:
+                    f.seek(byte_range[0] if byte_range else 0)
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        if self._stop_setup.is_set() or cancel.is_set():
+                            raise SetupError("download cancelled")
+                        f.write(chunk)
+                        with lock:
+                            downloaded += len(chunk)
+                            # Show progress in 10% steps, one line each
+                            if show_progress and total > 0:
+                                step = downloaded * 10 // total
+                                if step != last_step:
+                                    log(f"   Downloading voice: {step * 10}%")
+                                    last_step = step
+
+        try:
+            with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+                try:
+                    for future in as_completed([pool.submit(fetch, byte_range) for byte_range in ranges]):
+                        future.result()
+                except BaseException:
+                    cancel.set()
+                    raise
+            os.replace(part_path, path)
+            return etag
+        finally:
+            if part_path.exists():
+                part_path.unlink()
+
+    def _load_voice(self):
+        """Load the voice model into an ONNX Runtime session tuned for this machine."""
+        sess_opts = onnxruntime.SessionOptions()
+        # Use every core for a single synthesis (the default leaves half of them idle)
+        sess_opts.intra_op_num_threads = os.cpu_count() or 1
+        sess_opts.inter_op_num_threads = 1
+        sess_opts.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        sess_opts.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+
+        with open(f"{self.voice_model}.json", encoding="utf-8") as f:
+            config = PiperConfig.from_dict(json.load(f))
+
+        use_cuda = self.use_cuda
+        if use_cuda and "CUDAExecutionProvider" not in onnxruntime.get_available_providers():
+            log("⚠️  CUDA not available (install onnxruntime-gpu), using CPU")
+            use_cuda = False
+
+        if use_cuda:
+            providers = ["CUDAExecutionProvider", "CPUExecutionProvider"]
+            provider_options = [{"cudnn_conv_algo_search": "HEURISTIC"}, {}]
+        else:
+            providers = ["CPUExecutionProvider"]
+            provider_options = None
+
+        # Prefer an int8 copy made by tools/quantize_voice.py on CPU, unless the voice was
+        # downloaded again since it was made. CUDA has no kernels for its quantized ops.
+        model_path = Path(self.voice_model)
+        int8_path = model_path.with_suffix(".int8.onnx")
+        if int8_path.exists() and not use_cuda:
+            if int8_path.stat().st_mtime > model_path.stat().st_mtime:
+                log(f"⚡ Using quantized voice model {int8_path.name}")
+                model_path = int8_path
+            else:
+                log(f"⚠️  {int8_path.name} is older than {model_path.name}; re-run tools/quantize_voice.py")
+
+        session = onnxruntime.InferenceSession(
+            str(model_path),
+            sess_options=sess_opts,
+            providers=providers,
+            provider_options=provider_options
+        )
+        self.voice = PiperVoice(session=session, config=config)
+
+        # Phonemes depend on the voice, so each voice gets a fresh cache
+        self._phoneme_ids = functools.lru_cache(maxsize=PHONEME_CACHE_SIZE)(self._phonemize)
+
+        if use_cuda:
+            # The first CUDA inference pays for cuDNN kernel selection; do it now, not on the first reply
+            log("🔥 Warming up CUDA...")
+            phoneme_ids = self.voice.phonemes_to_ids(self.voice.phonemize("Hello.")[0])
+            self.voice.phoneme_ids_to_audio(phoneme_ids)
+            log("✅ CUDA warmup complete")
+
+    def _start_player(self):
+        """Open the audio output: a sounddevice stream if available, else a player reading raw PCM on stdin."""
+        if sounddevice:
+            try:
+                self.audio_stream = sounddevice.RawOutputStream(
+                    samplerate=self.voice.config.sample_rate,
+                    channels=1,
+                    dtype="int16",
+                    blocksize=1024
+                )
+                self.audio_stream.start()
+                return
+            except Exception as e:
+                self.audio_stream = None
+                log(f"⚠️  sounddevice unavailable ({e}), falling back to an external player")
+
+        player_cmd = self._find_player()
+        if player_cmd:
+            self.player_proc = subprocess.Popen(
+                player_cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                bufsize=0
             )
+        # Without ffplay, Windows plays each sentence in-process instead
+        self.wav_playback = player_cmd is None and platform.system() == "Windows"
 
-            # Check if speech generation was successful
+    def _stop_player(self):
+        """Close the audio stream and terminate the audio player."""
+        if self.audio_stream:
+            try:
+                self.audio_stream.stop()
+                self.audio_stream.close()
+            except Exception:
+                pass
+            self.audio_stream = None
+
+        proc = self.player_proc
+        if proc and proc.poll() is None:
+            try:
+                proc.stdin.close()
+                proc.terminate()
+                proc.wait(timeout=5)
+            except Exception:
+                proc.kill()
+        self.player_proc = None
+
+    def _find_player(self):
+        """Find an audio player that reads raw 16-bit mono PCM from stdin."""
+        rate = str(self.voice.config.sample_rate)
+        ffplay = ["ffplay", "-nodisp", "-autoexit", "-loglevel", "quiet", "-f", "s16le", "-ar", rate, "-"]
+
+        if platform.system() == "Linux":
+            players = [
+                ["aplay", "-q", "-r", rate, "-f", "S16_LE", "-c", "1", "-t", "raw"],
+                ["paplay", "--raw", f"--rate={rate}", "--format=s16le", "--channels=1"],
+                ffplay,
+            ]
+        else:
+            # Avoids PowerShell/afplay startup and any WAV round-trip
+            players = [ffplay]
+
+        for cmd in players:
+            if shutil.which(cmd[0]):
+                return cmd
+
+        if platform.system() != "Windows":
+            log(f"⚠️  No audio player found (tried: {', '.join(cmd[0] for cmd in players)})")
+        return None
+
+    def _play_wav(self, pcm):
+        """Play samples synchronously as a WAV, for Windows systems without ffplay."""
+        wav = io.BytesIO()
+        with wave.open(wav, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(self.voice.config.sample_rate)
+            f.writeframes(pcm)
+
+        if winsound:
+            # In-process, no PowerShell startup per sentence
+            winsound.PlaySound(wav.getvalue(), winsound.SND_MEMORY)
+            return
+
+        # winsound is CPython-only; fall back to PowerShell's SoundPlayer
+        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
+            f.write(wav.getvalue())
+        try:
+            result = subprocess.run(
+                ["powershell", "-c", f"(New-Object Media.SoundPlayer '{f.name}').PlaySync()"],
+                timeout=60,
+                capture_output=True
+            )
             if result.returncode != 0:
-                print(" Failed!")
-                print(f"⚠️  Piper error: {result.stderr}")
-                return
+                log(f"⚠️  Playback issue: {result.stderr.decode() if result.stderr else 'Unknown error'}")
+        finally:
+            os.unlink(f.name)
 
-            # Verify audio file was created and has content
-            if not os.path.exists(audio_file) or os.path.getsize(audio_file) == 0:
-                print(" Failed!")
-                print("⚠️  No audio file generated")
-                return
+    def text_to_speech(self, text):
+        """Convert text to speech using Piper and wait for it to be played."""
+        self._tts_q.put(text)
+        self._finish_speech()
+
+    def _drain_speech(self):
+        """Discard sentences and audio that are still waiting to be spoken."""
+        for q in (self._tts_q, self._pcm_q):
+            while True:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    break
 
-            print(" Done!")
-            print("▶️  Playing audio...")
+    def _finish_speech(self):
+        """Mark the end of an utterance and wait until all of it has been played."""
+        self._speech_done.clear()
+        self._tts_q.put(None)
+        self._speech_done.wait()
+
+    def _phonemize(self, text):
+        """Convert text to phoneme ids, one tuple per sentence."""
+        return tuple(
+            tuple(self.voice.phonemes_to_ids(phonemes))
+            for phonemes in self.voice.phonemize(text)
+        )
+
+    def _synthesize(self, text):
+        """Yield int16 audio for each sentence of text, skipping phonemization for repeated text."""
+        for phoneme_ids in self._phoneme_ids(text):
+            audio = self.voice.phoneme_ids_to_audio(list(phoneme_ids))
+
+            # Same normalization as PiperVoice.synthesize
+            peak = np.max(np.abs(audio))
+            audio = audio / peak if peak >= 1e-8 else np.zeros_like(audio)
+            audio = np.clip(audio, -1.0, 1.0).astype(np.float32)
+
+            yield AudioChunk(
+                sample_rate=self.voice.config.sample_rate,
+                sample_width=2,
+                sample_channels=1,
+                audio_float_array=audio
+            ).audio_int16_array
+
+    def _print_cache_stats(self):
+        """Report how often repeated text skipped phonemization."""
+        info = self._phoneme_ids.cache_info()
+        lookups = info.hits + info.misses
+        if lookups:
+            log(f"🧠 Phoneme cache: {info.hits}/{lookups} hits ({info.hits / lookups:.0%})")
+
+    def _chunk_text(self, text, max_chars=240):
+        """Split text into sentence-aligned chunks of at most max_chars where possible."""
+        chunks = []
+        for sentence in CHUNK_BOUNDARIES[0].split(text.strip()):
+            chunks.extend(self._split_long(sentence, max_chars, 1))
+        return [chunk for chunk in chunks if chunk]
+
+    def _split_long(self, text, max_chars, level):
+        """Split text on CHUNK_BOUNDARIES[level] and re-pack the pieces up to max_chars."""
+        if len(text) <= max_chars or level == len(CHUNK_BOUNDARIES):
+            return [text]
+
+        chunks = []
+        for piece in CHUNK_BOUNDARIES[level].split(text):
+            for part in self._split_long(piece, max_chars, level + 1):
+                if chunks and len(chunks[-1]) + 1 + len(part) <= max_chars:
+                    chunks[-1] += " " + part
+                else:
+                    chunks.append(part)
+        return chunks
+
+    def _write_pcm(self, pcm):
+        """Write samples straight to the player's pipe, without copying them into bytes first."""
+        view = memoryview(pcm).cast("B")
+        fd = self.player_proc.stdin.fileno()
+        while view:
+            view = view[os.write(fd, view):]
+
+    def _has_audio_output(self):
+        """Check whether synthesized speech has anywhere to go."""
+        return self.audio_stream is not None or self.player_proc is not None or self.wav_playback
+
+    def _tts_worker(self):
+        """Synthesize queued text into PCM chunks, in order."""
+        while True:
+            text = self._tts_q.get()
+            if text is None:
+                self._pcm_q.put(None)
+                continue
 
-            self._play_audio(audio_file)
+            text = " ".join(text.split())
+            if not text or not self._has_audio_output():
+                continue
 
-            # Clean up temp file
             try:
-                os.unlink(audio_file)
-            except:
-                pass
+                for chunk in self._chunk_text(text):
+                    for audio in self._synthesize(chunk):
+                        self._pcm_q.put(audio)
+            except Exception as e:
+                log(f"\n⚠️  TTS error: {e}")
 
-        except subprocess.TimeoutExpired:
-            print(" Timeout!")
-            print("⚠️  Speech generation took too long")
-        except Exception as e:
-            print(f" Error!")
-            print(f"⚠️  TTS error: {e}")
+    def _audio_worker(self):
+        """Write synthesized PCM to the audio player as it arrives."""
+        while True:
+            pcm = self._pcm_q.get()
+            if pcm is None:
+                self._speech_done.set()
+                continue
+
+            try:
+                if self.audio_stream:
+                    self.audio_stream.write(pcm)
+                elif self.player_proc:
+                    if self.player_proc.poll() is not None:
+                        raise BrokenPipeError("audio player exited")
+                    self._write_pcm(pcm)
+                elif self.wav_playback:
+                    self._play_wav(pcm)
+            except BrokenPipeError:
+                # Drop the dead player so the TTS worker stops synthesizing for it
+                log("\n⚠️  Audio player exited; continuing without voice")
+                proc, self.player_proc = self.player_proc, None
+                try:
+                    proc.stdin.close()
+                except Exception:
+                    pass
+            except Exception as e:
+                log(f"\n⚠️  Playback error: {e}")
+
+    def _queue_sentences(self, buffer):
+        """Queue every completed sentence in buffer for speech, return the remainder."""
+        end = 0
+        for match in SENT_RE.finditer(buffer):
+            self._tts_q.put(match.group(1).strip())
+            end = match.end()
+        return buffer[end:]
+
+    def _iter_ndjson(self, response):
+        """Yield objects from a streamed NDJSON response, whatever the network chunking."""
+        buffer = b""
+        for chunk in response.iter_content(chunk_size=None):
+            buffer += chunk
+            # Only complete lines are parsed; a partial one waits for the next chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                yield from self._parse_ndjson_line(line)
+
+        # The final object may not be newline-terminated
+        yield from self._parse_ndjson_line(buffer)
+
+    def _parse_ndjson_line(self, line):
+        """Parse one NDJSON line, which some proxies pack with several objects."""
+        line = line.strip()
+        if not line:
+            return
 
-    def _play_audio(self, audio_file):
-        """Play audio file."""
-        system = platform.system()
         try:
-            if system == "Windows":
-                # Use PowerShell to play the audio synchronously
-                result = subprocess.run(
-                    ["powershell", "-c", f"(New-Object Media.SoundPlayer '{audio_file}').PlaySync()"],
-                    timeout=60,
-                    capture_output=True
-                )
-                if result.returncode != 0:
-                    print(f"⚠️  Playback issue: {result.stderr.decode() if result.stderr else 'Unknown error'}")
-            elif system == "Darwin":
-                subprocess.run(["afplay", audio_file], timeout=60)
-            else:
-                played = False
-                for player in ["aplay", "paplay", "ffplay"]:
-                    try:
-                        subprocess.run([player, audio_file], timeout=60)
-                        played = True
-                        break
-                    except FileNotFoundError:
-                        continue
-                if not played:
-                    print("⚠️  No audio player found (tried: aplay, paplay, ffplay)")
-        except subprocess.TimeoutExpired:
-            print("⚠️  Audio playback timed out")
-        except Exception as e:
-            print(f"⚠️  Playback error: {e}")
+            data = json_loads(line)
+        except ValueError:
+            pass
+        else:
+            yield data
+            return
+
+        # Objects concatenated without newlines, e.g. '{...}{...}'
+        decoder = json.JSONDecoder()
+        text = line.decode("utf-8", errors="replace")
+        pos = 0
+        while pos < len(text):
+            try:
+                data, pos = decoder.raw_decode(text, pos)
+            except ValueError:
+                # Drop only the malformed fragment; the rest of the stream is still good
+                log(f"\n⚠️  Skipping malformed stream data: {text[pos:pos + 80]!r}")
+                return
+            yield data
+            while pos < len(text) and text[pos].isspace():
+                pos += 1
+
+    def _context_messages(self):
+        """Messages to send: any leading system prompt plus the most recent turns."""
+        history = self.conversation_history
+        system = history[:1] if history and history[0]["role"] == "system" else []
+        # The last max_history_turns user/assistant pairs, plus the new user message
+        recent = history[len(system):][-(2 * self.max_history_turns + 1):]
+        return system + recent
 
     def chat(self, user_message, use_voice=True):
         """Send message and get response."""
-        print(f"\n👤 You: {user_message}")
+        log(f"\n👤 You: {user_message}")
 
         self.conversation_history.append({"role": "user", "content": user_message})
 
         try:
-            response = requests.post(
+            with self.http.post(
                 f"{self.ollama_url}/api/chat",
-                json={
+                data=json_dumps({
                     "model": self.model_name,
-                    "messages": self.conversation_history,
-                    "stream": False
-                },
+                    "messages": self._context_messages(),
+                    "stream": True,
+                    "options": {"num_ctx": OLLAMA_NUM_CTX}
+                }),
+                headers=JSON_HEADERS,
+                stream=True,
                 timeout=120
-            )
-
-            result = response.json()
-
-            # Check for error in response
-            if "error" in result:
-                print(f"❌ Ollama error: {result['error']}")
-                # Remove failed message from history
-                self.conversation_history.pop()
-                return None
-
-            # Extract message content
-            if "message" not in result:
-                print(f"❌ Unexpected response format: {result}")
-                self.conversation_history.pop()
-                return None
+            ) as response:
+                # Ollama streams one JSON object per line; speak each sentence as soon as it completes
+                parts = []
+                buffer = ""
+                log("🤖 Assistant: ", end="", flush=True)
+                for data in self._iter_ndjson(response):
+                    # Check for error in response
+                    if "error" in data:
+                        log()
+                        log(f"❌ Ollama error: {data['error']}")
+                        # Remove failed message from history
+                        self.conversation_history.pop()
+                        return None
+
+                    # Extract message content
+                    if "message" not in data:
+                        log()
+                        log(f"❌ Unexpected response format: {data}")
+                        self.conversation_history.pop()
+                        return None
+
+                    content = data["message"].get("content", "")
+                    if content:
+                        log(content, end="", flush=True)
+                        parts.append(content)
+                        if use_voice:
+                            buffer = self._queue_sentences(buffer + content)
+
+                    if data.get("done"):
+                        break
+                log()
 
-            assistant_message = result["message"]["content"]
+            # Flush whatever is left after the final sentence boundary
+            if use_voice and buffer.strip():
+                self._tts_q.put(buffer.strip())
 
+            assistant_message = "".join(parts)
             self.conversation_history.append({"role": "assistant", "content": assistant_message})
 
-            print(f"🤖 Assistant: {assistant_message}")
-
-            if use_voice:
-                self.text_to_speech(assistant_message)
-
             return assistant_message
         except requests.exceptions.Timeout:
-            print("❌ Request timed out. The model may be loading or busy.")
+            log("❌ Request timed out. The model may be loading or busy.")
             self.conversation_history.pop()
             return None
         except Exception as e:
-            print(f"❌ Error: {e}")
+            log(f"❌ Error: {e}")
             # Remove failed message from history
             if self.conversation_history and self.conversation_history[-1]["role"] == "user":
                 self.conversation_history.pop()
             return None
+        except KeyboardInterrupt:
+            # Drop unspoken sentences so Ctrl-C doesn't wait out a long reply
+            if use_voice:
+                self._drain_speech()
+            raise
+        finally:
+            # Let queued speech finish on every exit path before prompting for the next message
+            if use_voice:
+                self._finish_speech()
 
     def run_interactive(self):
         """Run interactive chat loop."""
-        print("=" * 60)
-        print("🎙️  OLLAMA + PIPER CHATBOT")
-        print("=" * 60)
-        print("Commands:")
-        print("  - Type your message and press Enter")
-        print("  - Type 'voice:medium' or 'voice:high' to switch voices")
-        print("  - Type 'quit' or 'exit' to end")
-        print("=" * 60 + "\n")
+        log("=" * 60)
+        log("🎙️  OLLAMA + PIPER CHATBOT")
+        log("=" * 60)
+        log("Commands:")
+        log("  - Type your message and press Enter")
+        log("  - Type 'voice:medium' or 'voice:high' to switch voices")
+        log("  - Type 'quit' or 'exit' to end")
+        log("=" * 60 + "\n")
 
         while True:
             try:
@@ -405,32 +934,51 @@ class OllamaPiperChatbot:
                     continue
 
                 if user_input.lower() in ["quit", "exit", "bye"]:
-                    print("👋 Goodbye!")
+                    self._print_cache_stats()
+                    log("👋 Goodbye!")
                     break
 
                 # Voice switching
                 if user_input.lower().startswith("voice:"):
                     voice_type = user_input.split(":")[1].strip()
-                    voices_dir = Path(__file__).parent / "voices"
+                    old_voice = (self.voice_model, self._voice_name)
 
                     if voice_type == "medium":
-                        self.voice_model = str(voices_dir / "en_US-lessac-medium.onnx")
-                        print(f"🔊 Switched to medium quality voice")
+                        self.voice_model = str(VOICES_DIR / "en_US-lessac-medium.onnx")
                     elif voice_type == "high":
-                        self.voice_model = str(voices_dir / "en_US-lessac-high.onnx")
-                        print(f"🔊 Switched to high quality voice")
+                        self.voice_model = str(VOICES_DIR / "en_US-lessac-high.onnx")
                     else:
-                        print(f"⚠️  Unknown voice: {voice_type}")
+                        log(f"⚠️  Unknown voice: {voice_type}")
+                        continue
+
+                    self._voice_name = Path(self.voice_model).name
+
+                    # Reload the voice and restart the player at its sample rate; on failure
+                    # keep talking with the current voice
+                    try:
+                        self._ensure_voice_model()
+                        self._load_voice()
+                    except Exception as e:
+                        if not isinstance(e, SetupError):
+                            log(f"❌ Error: {e}")
+                        self.voice_model, self._voice_name = old_voice
+                        log(f"⚠️  Keeping voice {self._voice_name}")
+                        continue
+                    self._stop_player()
+                    self._start_player()
+                    log(f"🔊 Switched to {voice_type} quality voice")
                     continue
 
                 # Chat
                 self.chat(user_input, use_voice=True)
 
             except KeyboardInterrupt:
-                print("\n👋 Goodbye!")
+                log()
+                self._print_cache_stats()
+                log("👋 Goodbye!")
                 break
             except Exception as e:
-                print(f"❌ Error: {e}")
+                log(f"❌ Error: {e}")
 
 
 def main():
@@ -441,18 +989,19 @@ def main():
     parser.add_argument("--model", default="llama3.2", help="Ollama model name")
     parser.add_argument("--voice", choices=["medium", "high"], default="medium", help="Voice quality")
     parser.add_argument("--url", default="http://localhost:11434", help="Ollama API URL")
+    parser.add_argument("--cuda", action="store_true", help="Run Piper on the GPU (requires onnxruntime-gpu)")
 
     args = parser.parse_args()
 
     # Set voice model path
-    voices_dir = Path(__file__).parent / "voices"
-    voice_model = str(voices_dir / f"en_US-lessac-{args.voice}.onnx")
+    voice_model = str(VOICES_DIR / f"en_US-lessac-{args.voice}.onnx")
 
     # Create chatbot
     chatbot = OllamaPiperChatbot(
         model_name=args.model,
         voice_model=voice_model,
-        ollama_url=args.url
+        ollama_url=args.url,
+        use_cuda=args.cuda
     )
 
     # Run interactive mode
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Quantize Piper voice models to int8
+Writes <voice>.int8.onnx next to each voice; chatbot.py uses it automatically when present.
+
+Usage:
+    python tools/quantize_voice.py                      # Quantize every voice in voices/
+    python tools/quantize_voice.py voices/en_US-lessac-high.onnx
+
+Requires the onnx package: pip install onnx
+"""
+
+import sys
+from pathlib import Path
+
+VOICES_DIR = Path(__file__).resolve().parent.parent / "voices"
+
+
+def quantize_voice(voice_path):
+    """Quantize MatMul/Gemm weights of a voice model to int8."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    output_path = voice_path.with_suffix(".int8.onnx")
+    print(f"⚙️  Quantizing {voice_path.name}...")
+    quantize_dynamic(
+        model_input=voice_path,
+        model_output=output_path,
+        weight_type=QuantType.QInt8,
+        op_types_to_quantize=["MatMul", "Gemm"]
+    )
+
+    size_in = voice_path.stat().st_size / 1e6
+    size_out = output_path.stat().st_size / 1e6
+    print(f"✅ Wrote {output_path.name} ({size_in:.1f} MB -> {size_out:.1f} MB)")
+
+
+def main():
+    """Main entry point."""
+    if len(sys.argv) > 1:
+        voices = [Path(arg) for arg in sys.argv[1:]]
+    else:
+        voices = sorted(p for p in VOICES_DIR.glob("*.onnx") if not p.name.endswith(".int8.onnx"))
+
+    if not voices:
+        print(f"❌ No voice models found in {VOICES_DIR}")
+        sys.exit(1)
+
+    try:
+        import onnx  # noqa: F401 (required by onnxruntime.quantization)
+    except ImportError:
+        print("❌ onnx not found! Install with: pip install onnx")
+        sys.exit(1)
+
+    for voice_path in voices:
+        if not voice_path.exists():
+            print(f"❌ Voice model not found: {voice_path}")
+            sys.exit(1)
+        quantize_voice(voice_path)
+
+
+if __name__ == "__main__":
+    main()